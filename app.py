@@ -1,6 +1,9 @@
 import io, re, urllib.parse, requests
+from functools import lru_cache
 import streamlit as st
 import pdfplumber
+import fitz  # PyMuPDF
+import ahocorasick
 from pdfminer.high_level import extract_text as pdfminer_extract_text
 from pdfminer.layout import LAParams
 
@@ -17,7 +20,9 @@ US_ALIASES = {"us", "u.s.", "usa", "u.s.a.", "united states"}
 CN_ALIASES = {"cn", "prc", "china"}
 
 # Heuristic rules to choose an emoji for each BULLET item (no word changes).
-# The first matching pattern wins. Tweak these patterns to your liking.
+# The first matching pattern wins. Tweak these patterns to your liking, but keep each one a plain
+# "|" alternation of lowercase keywords ("-?" for an optional hyphen is allowed); any other regex
+# syntax raises ValueError at startup.
 EMOJI_RULES = [
     (r"flight|airline|airport|non-?stop|route", "✈️"),
     (r"warn|ban|sanction|probe|investigat|violate|must-?nots|interfer", "🚫"),
@@ -26,21 +31,71 @@ EMOJI_RULES = [
     (r"stock|market|index|shares|rall|sell-?off|volume|hang seng|hsi|overbought|resistance|support", "📈"),
 ]
 
+# Every rule is a plain keyword alternation (with optional "-?" hyphens), so all rules go into one
+# Aho-Corasick automaton: a single linear pass finds every keyword hit. Values are rule indexes;
+# the lowest index among the hits wins, keeping "first matching rule wins".
+# Rebuilt on every run (about 60 keywords, microseconds), so it always matches the current EMOJI_RULES.
+def _build_emoji_automaton():
+    keywords = {}
+    for i, (pattern, _) in enumerate(EMOJI_RULES):
+        for alt in pattern.split("|"):
+            for kw in {alt.replace("-?", "-"), alt.replace("-?", "")}:
+                if not kw or any(c in kw for c in "\\.^$*+?()[]{}"):
+                    raise ValueError(f"EMOJI_RULES keyword is not a literal: {alt!r}")
+                keywords.setdefault(kw, i)
+    automaton = ahocorasick.Automaton()
+    for kw, i in keywords.items():
+        automaton.add_word(kw, i)
+    automaton.make_automaton()
+    return automaton
+
+EMOJI_AUTOMATON = _build_emoji_automaton()
+
+# Compiled once per script run instead of once per call / per line.
+WS_RE = re.compile(r"\s+")
+HEADING_ENUM = r"(?:\d+\s*[.)]\s*)?"
+# All target headings in one pattern; group names are the SECTION_ORDER keys (read via m.lastgroup).
+H_ANY = re.compile(
+    rf"^{HEADING_ENUM}(?:"
+    r"(?P<todays_must_know_news>today'?s\s+must-?know\s+news)"
+    r"|(?P<americas>americas)"
+    r"|(?P<greater_china>greater\s+china)"
+    r")\s*$"
+)
+# One line plus its terminator; same boundaries as str.splitlines (pdfminer emits \f between pages).
+LINE_BREAKS = "\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029"
+LINE_RE = re.compile(rf"[^{LINE_BREAKS}]*(?:\r\n|[{LINE_BREAKS}])?")
+
+NORM_TRANS = str.maketrans({"’": "'", "–": "-", "—": "-"})
+HEADING_MAX_LEN = 80  # longer (stripped) lines are never treated as headings
+HEADING_END_PUNCT = (".", "!", "?", ";", ",")  # lines ending like a sentence aren't headings either
+# "u.s." / "u.s.a." end in punctuation but are still valid first lines of a two-line heading.
+PUNCT_ALIAS_MAX_LEN = max(len(a) for a in US_ALIASES | CN_ALIASES if a.endswith(HEADING_END_PUNCT))
+
 def normalize(s: str) -> str:
     # Only for heading detection (NOT used for output)
-    s = s.replace("’", "'").replace("–", "-").replace("—", "-")
-    s = re.sub(r"\s+", " ", s.strip())
-    return s.lower()
+    return WS_RE.sub(" ", s.translate(NORM_TRANS).strip()).lower()
 
 # ---------- Extraction engines ----------
+def extract_text_pymupdf(pdf_bytes: bytes) -> str:
+    """PyMuPDF's C text extractor: no Python-side layout analysis, typically ~10x faster than pdfminer."""
+    try:
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+            return "".join(p.get_text("text") for p in doc)
+    except Exception:
+        return ""
+
 def extract_verbatim_pdfminer(pdf_bytes: bytes) -> str:
     """Use pdfminer.six with parameters that try to keep line breaks and bullets."""
+    # all_texts=True is required: without it, text inside Form XObjects is emitted with no line breaks.
     laparams = LAParams(char_margin=2.0, line_margin=0.15, word_margin=0.1, boxes_flow=None, all_texts=True)
     try:
         return pdfminer_extract_text(io.BytesIO(pdf_bytes), laparams=laparams) or ""
     except Exception:
         return ""
 
+# st.cache_data is shared by every user for the life of the server, so each cache is bounded.
+@st.cache_data(show_spinner=False, max_entries=16, ttl="1h")
 def extract_text_pdfplumber(pdf_bytes: bytes) -> str:
     pages = []
     with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
@@ -48,133 +103,153 @@ def extract_text_pdfplumber(pdf_bytes: bytes) -> str:
             pages.append(p.extract_text(x_tolerance=1, y_tolerance=1) or "")
     return "".join(pages)
 
-def extract_text_verbatim(pdf_bytes: bytes) -> str:
-    t = extract_verbatim_pdfminer(pdf_bytes)
+@st.cache_data(show_spinner=False, max_entries=16, ttl="1h")
+def extract_text_verbatim(pdf_bytes: bytes, fast: bool = True) -> str:
+    t = extract_text_pymupdf(pdf_bytes) if fast else ""
+    if not t.strip():
+        t = extract_verbatim_pdfminer(pdf_bytes)
     if not t.strip():
         t = extract_text_pdfplumber(pdf_bytes)
     return t
 
 # ---------- Section finding ----------
+@st.cache_data(show_spinner=False, max_entries=16, ttl="1h")
 def find_section_spans(full_text: str):
     """Return dict: key -> (start_abs, end_abs, heading_line_index). Supports two-line headings."""
-    lines = full_text.splitlines(keepends=True)
-    L = [(i, raw, normalize(raw)) for i, raw in enumerate(lines)]
-    enum = r"(?:\d+\s*[.)]\s*)?"
-
-    H_TODAY = re.compile(rf"^{enum}today'?s\s+must-?know\s+news\s*$")
-    H_AMER  = re.compile(rf"^{enum}americas\s*$")
-    H_GC    = re.compile(rf"^{enum}greater\s+china\s*$")
-
-    def looks_like_heading(raw: str) -> bool:
-        s = raw.strip()
-        return bool(s) and len(s) <= 80 and not s.endswith((".", "!", "?", ";", ","))
-
-    target_idx = {}
-    all_heads = set()
-    n = len(L)
-
-    for i, raw, norm in L:
-        if "todays_must_know_news" not in target_idx and H_TODAY.match(norm):
-            target_idx["todays_must_know_news"] = i
-        if "americas" not in target_idx and H_AMER.match(norm):
-            target_idx["americas"] = i
-        if "greater_china" not in target_idx and H_GC.match(norm):
-            target_idx["greater_china"] = i
-
-        # Two-line patterns: US + Americas, CN + Greater China
-        j = i + 1
-        while j < n and not L[j][1].strip():
-            j += 1
-        if j < n:
-            norm_i = norm
-            norm_j = L[j][2]
-            if ("americas" not in target_idx) and (norm_i in US_ALIASES) and H_AMER.match(norm_j):
-                target_idx["americas"] = i
-            if ("greater_china" not in target_idx) and (norm_i in CN_ALIASES) and H_GC.match(norm_j):
-                target_idx["greater_china"] = i
-
-        if looks_like_heading(raw):
-            all_heads.add(i)
-
-    all_heads_sorted = sorted(all_heads)
-
-    def span_from(start_line: int):
-        end_line = len(lines)
-        for h in all_heads_sorted:
+    # One streaming pass over the text. Nothing is stored per line: only heading and target lines
+    # keep (line_index, start_abs), which is all span_from needs.
+    # norm is "" for blank lines, and only computed for lines that could be a heading or alias;
+    # everything else (long lines, sentence-like lines) gets None and is never normalized.
+    all_heads = []  # (line_index, start_abs), appended in line order, so already sorted
+    target_idx = {}  # key -> (line_index, start_abs)
+    pending_alias = None  # (line_index, start_abs, norm) of a US/CN alias waiting for its next non-blank line
+    n_targets = len(SECTION_ORDER)
+
+    i = -1
+    for m in LINE_RE.finditer(full_text):
+        start, end = m.span()
+        if start == end:  # trailing empty match at end of text
+            continue
+        i += 1
+        s = full_text[start:end].strip()
+        if not s:
+            continue
+        is_head = False
+        if len(s) > HEADING_MAX_LEN:
+            norm = None
+        elif not s.endswith(HEADING_END_PUNCT):
+            is_head = True
+            norm = normalize(s)
+        else:
+            norm = normalize(s) if len(s) <= PUNCT_ALIAS_MAX_LEN else None
+
+        key = None
+        # Cheap substring gate: every H_ANY match contains one of these words.
+        if norm and ("today" in norm or "americas" in norm or "china" in norm):
+            hm = H_ANY.match(norm)
+            key = hm.lastgroup if hm else None
+
+        # Two-line patterns: US + Americas, CN + Greater China (this line is the alias's next non-blank line)
+        if pending_alias is not None:
+            alias_i, alias_start, alias_norm = pending_alias
+            if ("americas" not in target_idx) and (alias_norm in US_ALIASES) and key == "americas":
+                target_idx["americas"] = (alias_i, alias_start)
+            if ("greater_china" not in target_idx) and (alias_norm in CN_ALIASES) and key == "greater_china":
+                target_idx["greater_china"] = (alias_i, alias_start)
+        if key:
+            target_idx.setdefault(key, (i, start))
+        pending_alias = (i, start, norm) if norm in US_ALIASES or norm in CN_ALIASES else None
+
+        if is_head:
+            all_heads.append((i, start))
+            # Every target found and a heading after the last one: all spans are closed, stop scanning.
+            if len(target_idx) == n_targets and i > max(t for t, _ in target_idx.values()):
+                break
+
+    def span_from(start_line: int, start_abs: int):
+        end_abs = len(full_text)
+        for h, h_start in all_heads:
             if h > start_line:
-                end_line = h
+                end_abs = h_start
                 break
-        start_abs = sum(len(lines[k]) for k in range(start_line))
-        end_abs   = sum(len(lines[k]) for k in range(end_line))
         return start_abs, end_abs, start_line
 
     spans = {}
     for key in ["todays_must_know_news", "americas", "greater_china"]:
         if key in target_idx:
-            spans[key] = span_from(target_idx[key])
+            spans[key] = span_from(*target_idx[key])
     return spans
 
 # ---------- Emoji helpers (bullet-level) ----------
-BULLET_PREFIX_RE = re.compile(r"^([ \t]*[•\-‣▪◦]\s+)(.*)$")  # capture bullet marker + payload
+BULLET_CHARS = frozenset("•-‣▪◦")  # bullet = [ \t]* + one of these + whitespace + payload
+
+@lru_cache(maxsize=512)
+def _emoji_for_normalized(t: str):
+    # Keyed on the normalized payload only, so every section's default icon shares the entries.
+    best = None
+    for _, i in EMOJI_AUTOMATON.iter(t):
+        if best is None or i < best:
+            best = i
+            if best == 0:
+                break
+    return EMOJI_RULES[best][1] if best is not None else None
 
 def pick_emoji_for_text(payload: str, default_icon: str) -> str:
-    t = normalize(payload)
-    for pattern, emoji in EMOJI_RULES:
-        if re.search(pattern, t):
-            return emoji
-    return default_icon
+    return _emoji_for_normalized(normalize(payload)) or default_icon
 
 def add_emoji_to_bullets(section_text: str, default_icon: str) -> str:
     """Prefix an emoji ONLY on the first line of each bullet item. Words remain untouched."""
-    out_lines = []
+    out_lines = section_text.splitlines()  # rewritten in place
     in_bullet = False
-    for line in section_text.splitlines():
-        m = BULLET_PREFIX_RE.match(line)
-        if m:
-            # New bullet start
-            marker, payload = m.group(1), m.group(2)
+    for idx, line in enumerate(out_lines):
+        body = line.lstrip(" \t")
+        if len(body) >= 2 and body[0] in BULLET_CHARS and body[1].isspace():
+            # New bullet start; indent + marker + payload is the whole line, so prefix it as-is
+            payload = body[1:].lstrip()
             emoji = pick_emoji_for_text(payload, default_icon)
-            out_lines.append(f"{emoji} {marker}{payload}")
+            out_lines[idx] = emoji + " " + line
             in_bullet = True
-        else:
-            # Continuation or normal line
-            out_lines.append(line)
-            if not line.strip():
-                in_bullet = False
+        elif not line.strip():
+            # Continuation or normal lines stay untouched
+            in_bullet = False
     return "\n".join(out_lines)
 
 def add_icon_each_line(section_text: str, icon: str) -> str:
     """Simple mode: prefix icon to every non-empty line (no word changes)."""
-    lines = []
-    for line in section_text.splitlines():
+    prefix = icon + " "
+    lines = section_text.splitlines()
+    for idx, line in enumerate(lines):
         if line.strip():
-            lines.append(f"{icon} {line}")
-        else:
-            lines.append(line)
+            lines[idx] = prefix + line
     return "\n".join(lines)
 
 def split_for_platform(s: str, limit: int = 1800):
     if len(s) <= limit:
         return [s]
-    parts, remain = [], s
-    while len(remain) > limit:
-        window = remain[:limit]
-        cut = window.rfind("\n\n")
-        if cut < 0: cut = window.rfind("\n")
-        if cut < 0: cut = limit
-        parts.append(remain[:cut])
-        remain = remain[cut:]
-        if remain.startswith("\n"): remain = remain[1:]
-    if remain: parts.append(remain)
+    # Walk an index through s instead of re-slicing the remainder (O(n) copying, not O(n²/limit)).
+    parts, i, n = [], 0, len(s)
+    while n - i > limit:
+        cut = s.rfind("\n\n", i, i + limit)
+        if cut < 0: cut = s.rfind("\n", i, i + limit)
+        if cut < 0: cut = i + limit
+        parts.append(s[i:cut])
+        i = cut
+        if s.startswith("\n", i): i += 1
+    if i < n: parts.append(s[i:])
     return parts
 
+@st.cache_data(show_spinner=False, max_entries=64, ttl="1h")  # a few sections x icon modes per PDF
+def whatsapp_url(message: str) -> str:
+    """Click-to-Chat link; cached so reruns don't percent-encode the whole section again."""
+    return "https://wa.me/?text=" + urllib.parse.quote(message)
+
 # ---------- UI ----------
 st.title("PDF → Sections (verbatim)")
 
 left, right = st.columns([2, 1], gap="large")
 with right:
     st.markdown("**Options**")
-    engine = st.selectbox("Extraction engine", ["PDFMiner (verbatim)", "pdfplumber (fallback)"], index=0)
+    engine = st.selectbox("Extraction engine", ["PyMuPDF (fast)", "PDFMiner (verbatim)", "pdfplumber (fallback)"], index=0)
     mode = st.radio("Icon mode", ["Auto emoji on bullets", "Same icon on every line"], index=0)
     monospace = st.checkbox("Show in monospace (preserve alignment)", value=True)
     webhook = st.text_input("Discord Webhook URL (optional)", type="password")
@@ -185,7 +260,12 @@ with left:
     if file:
         try:
             pdf_bytes = file.read()
-            full = extract_text_verbatim(pdf_bytes) if engine.startswith("PDFMiner") else extract_text_pdfplumber(pdf_bytes)
+            if engine.startswith("PyMuPDF"):
+                full = extract_text_verbatim(pdf_bytes)
+            elif engine.startswith("PDFMiner"):
+                full = extract_text_verbatim(pdf_bytes, fast=False)
+            else:
+                full = extract_text_pdfplumber(pdf_bytes)
             if not full.strip():
                 st.error("Could not extract selectable text. This may be a scanned/image PDF.")
                 st.stop()
@@ -221,17 +301,19 @@ with left:
                 use_container_width=True
             )
 
-            wa_url = "https://wa.me/?text=" + urllib.parse.quote(message)
+            wa_url = whatsapp_url(message)
             st.markdown(f"[Share to WhatsApp (prefilled)]({wa_url})") 
 
             if webhook:
                 if st.button(f"Send {label} to Discord (webhook)", use_container_width=True):
                     try:
-                        for ch in split_for_platform(message):
-                            resp = requests.post(webhook, json={"content": ch}, timeout=10)
-                            if resp.status_code >= 300:
-                                st.error(f"Webhook error {resp.status_code}: {resp.text[:200]}"); break
-                        else:
-                            st.success("Sent to Discord.")
+                        # One keep-alive session per send: later chunks skip the TCP/TLS handshake.
+                        with requests.Session() as http:
+                            for ch in split_for_platform(message):  # sequential: Discord must get chunks in order
+                                resp = http.post(webhook, json={"content": ch}, timeout=10)
+                                if resp.status_code >= 300:
+                                    st.error(f"Webhook error {resp.status_code}: {resp.text[:200]}"); break
+                            else:
+                                st.success("Sent to Discord.")
                     except Exception as e:
                         st.error(f"Failed to send: {e}")